@@ -1,96 +1,146 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, status
 from fastapi.responses import StreamingResponse
 from typing import Optional, List
+from concurrent.futures import Executor
+import asyncio
 import io
+import orjson
 from loguru import logger
-from src.services.resume_parser import ResumeParser
+from src.services.resume_parser import ResumeParser, extract_pdf_text, extract_text
 from src.services.match_engine import MatchEngine
-from src.services.storage import storage_adapter
-from src.services.pdf_generator import PDFReportGenerator
-from pdfminer.high_level import extract_text as pdf_extract_text
+from src.services.storage import storage_adapter, pack_embedding
+from src.services.cache import content_hasher
 from docx import Document
 from src.models.schemas import JobDescription, ResumeExtract, MatchOutput
 
 router = APIRouter()
-resume_parser = ResumeParser()
-match_engine = MatchEngine()
-pdf_generator = PDFReportGenerator()
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _read_job_description(content: bytes, filename: str) -> str:
+    ext = filename.split('.')[-1].lower()
+    if ext == "pdf":
+        return extract_pdf_text(content)
+    if ext in ["docx", "doc"]:
+        doc = Document(io.BytesIO(content))
+        return "\n".join([p.text for p in doc.paragraphs])
+    return content.decode(errors='ignore')
+
+
+async def _upload_digest(upload: UploadFile) -> str:
+    # Hash the spooled upload in chunks so cached resumes are never loaded whole into memory
+    hasher = content_hasher()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+    await upload.seek(0)
+    return hasher.hexdigest()
+
+
+async def _parse_uploads(
+    resume_parser: ResumeParser, pool: Executor, uploads: List[UploadFile], digests: List[str]
+) -> List[Optional[ResumeExtract]]:
+    filenames = [upload.filename for upload in uploads]
+    extracts = [resume_parser.cached_extract(digest) for digest in digests]
+    misses = [i for i, extract in enumerate(extracts) if extract is None]
+    if misses:
+        loop = asyncio.get_running_loop()
+        contents = await asyncio.gather(*[uploads[i].read() for i in misses])
+        texts = await asyncio.gather(*[
+            loop.run_in_executor(pool, extract_text, content, filenames[i])
+            for i, content in zip(misses, contents)
+        ], return_exceptions=True)
+        parsed = []
+        for i, text in zip(misses, texts):
+            if isinstance(text, BaseException):
+                logger.error(f"Failed to extract text from {filenames[i]}: {text}")
+            else:
+                parsed.append((i, text))
+        # Parse all new resumes together so their sections share one embedding pass; NER and
+        # encoding (and the first call's model load) are CPU-bound, so keep them off the event loop
+        extracts_batch = await asyncio.to_thread(resume_parser.parse_batch, [text for _, text in parsed])
+        for (i, _), extract in zip(parsed, extracts_batch):
+            resume_parser.cache_extract(digests[i], extract)
+            extracts[i] = extract
+    return extracts
 
 
 @router.post("/match-multiple", tags=["Resume Matching"])
 async def match_multiple_candidates(
+    request: Request,
     job_description_text: Optional[str] = Form(None),
     job_description_file: Optional[UploadFile] = File(None),
     resume_files: List[UploadFile] = File(...),
-    top_k: int = Form(5)
+    top_k: int = Form(5),
+    include_raw: bool = Form(False)
 ):
+    match_engine: MatchEngine = request.app.state.matcher
     job_desc_text = ""
     if job_description_file:
         content = await job_description_file.read()
-        ext = job_description_file.filename.split('.')[-1].lower()
-        if ext == "pdf":
-            job_desc_text = pdf_extract_text(io.BytesIO(content))
-        elif ext in ["docx", "doc"]:
-            doc = Document(io.BytesIO(content))
-            job_desc_text = "\n".join([p.text for p in doc.paragraphs])
-        else:
-            job_desc_text = content.decode(errors='ignore')
+        job_desc_text = await asyncio.to_thread(_read_job_description, content, job_description_file.filename)
     elif job_description_text:
         job_desc_text = job_description_text
     else:
         raise HTTPException(status_code=400, detail="Job description is required")
 
     candidates = []
-    resume_texts = {}
-    
-    for resume_file in resume_files:
-        content = await resume_file.read()
-        resume_extract = resume_parser.parse_bytes(content, filename=resume_file.filename)
+    digests = list(await asyncio.gather(*[_upload_digest(resume_file) for resume_file in resume_files]))
+    resume_extracts = await _parse_uploads(request.app.state.parser, request.app.state.pool, resume_files, digests)
+    # Resumes saved through /parse already carry a summary embedding for the current model
+    stored_embeddings = await asyncio.to_thread(
+        storage_adapter.get_resume_embeddings, digests, match_engine.embedding_model_name
+    )
+
+    for resume_file, resume_extract, digest in zip(resume_files, resume_extracts, digests):
+        if resume_extract is None:
+            continue
         candidates.append({
             "resume": resume_extract,
-            "filename": resume_file.filename
+            "filename": resume_file.filename,
+            "embedding": stored_embeddings.get(digest)
         })
-        resume_texts[resume_file.filename] = resume_extract.raw_text
 
     if not candidates:
         raise HTTPException(status_code=400, detail="No valid resumes could be parsed")
 
-    scored_candidates = []
-    for candidate in candidates:
-        match_result = await match_engine.score_resume_against_job_text(
-            candidate["resume"], 
-            job_desc_text
-        )
-        scored_candidates.append({
-            "candidate_name": candidate["resume"].candidate_name or "Unknown",
-            "filename": candidate["filename"],
-            "match_score": match_result.match_score,
-            "strengths": match_result.strengths,
-            "gaps": match_result.gaps,
-            "justification": match_result.justification
-        })
-
-    scored_candidates.sort(key=lambda x: x["match_score"], reverse=True)
+    ranked = await match_engine.score_batch(
+        [c["resume"] for c in candidates], job_desc_text, top_k, [c["embedding"] for c in candidates]
+    )
+    scored_candidates = [{
+        "candidate_name": candidates[i]["resume"].candidate_name or "Unknown",
+        "filename": candidates[i]["filename"],
+        "match_score": match_result.match_score,
+        "strengths": match_result.strengths,
+        "gaps": match_result.gaps,
+        "justification": match_result.justification
+    } for i, match_result in ranked]
     top_candidates = scored_candidates[:top_k]
-    
-    return {
+
+    response = {
         "total_candidates": len(candidates),
         "top_k": top_k,
-        "top_candidates": top_candidates,
-        "resume_texts": resume_texts
+        "top_candidates": top_candidates
     }
+    # Raw resume text is only needed for report generation; it is opt-in and
+    # limited to the returned candidates to keep the payload small
+    if include_raw:
+        top_filenames = {c["filename"] for c in top_candidates}
+        response["resume_texts"] = {
+            c["filename"]: c["resume"].raw_text for c in candidates if c["filename"] in top_filenames
+        }
+    return response
 
 @router.post("/generate-report", tags=["Resume Matching"])
 async def generate_pdf_report(
+    request: Request,
     job_description_text: str = Form(...),
     candidates_json: str = Form(...),
     resume_texts_json: str = Form(...)
 ):
-    import json
-    candidates = json.loads(candidates_json)
-    resume_texts = json.loads(resume_texts_json)
+    candidates = orjson.loads(candidates_json)
+    resume_texts = orjson.loads(resume_texts_json)
     
-    pdf_buffer = pdf_generator.generate_report(
+    pdf_buffer = request.app.state.pdf_generator.generate_report(
         job_description=job_description_text,
         candidates=candidates,
         resume_texts=resume_texts
@@ -103,26 +153,38 @@ async def generate_pdf_report(
     )
 
 @router.post("/parse", response_model=ResumeExtract, tags=["Resume Parsing"])
-async def parse_resume(file: UploadFile = File(...)):
-    content = await file.read()
-    extract = resume_parser.parse_bytes(content, filename=file.filename)
-    storage_adapter.save_resume(extract.model_dump())
+async def parse_resume(request: Request, file: UploadFile = File(...)):
+    digest = await _upload_digest(file)
+    extract = (await _parse_uploads(request.app.state.parser, request.app.state.pool, [file], [digest]))[0]
+    if extract is None:
+        raise HTTPException(status_code=400, detail="Resume could not be parsed")
+    match_engine: MatchEngine = request.app.state.matcher
+    # Store the summary embedding with the resume so later matches can skip re-embedding it
+    document = extract.model_dump()
+    document["content_hash"] = digest
+    document["embedding"] = pack_embedding(await match_engine.embed_resume(extract))
+    document["embedding_model"] = match_engine.embedding_model_name
+    await asyncio.to_thread(storage_adapter.save_resume, document)
     return extract
 
 @router.post("/match", response_model=MatchOutput, tags=["Resume Matching"])
 async def analyze_match(
+    request: Request,
     resume_text: str = Form(...),
     job_title: str = Form(...),
     job_description: str = Form(...),
     required_skills: Optional[str] = Form(None)
 ):
-    resume_extract = resume_parser.parse_text(resume_text)
+    # spaCy NER and the embedder (loaded on first use) are CPU-bound; keep them off the event loop
+    resume_extract = await asyncio.to_thread(request.app.state.parser.parse_text, resume_text)
     skills_list = [skill.strip() for skill in required_skills.split(',')] if required_skills else []
     job = JobDescription(title=job_title, description=job_description, required_skills=skills_list)
-    result = await match_engine.score_candidate_against_job(resume_extract, job)
+    result = await request.app.state.matcher.score_candidate_against_job(resume_extract, job)
     return result
 
 @router.get("/resumes", response_model=List[ResumeExtract], tags=["Resume Data"])
 async def get_all_resumes(limit: int = 20):
-    resumes = storage_adapter.get_all_resumes(limit=limit)
-    return [ResumeExtract(**resume) for resume in resumes]
\ No newline at end of file
+    # raw_text is part of the ResumeExtract response
+    resumes = storage_adapter.get_all_resumes(limit=limit, include_raw=True)
+    # Stored documents were validated on the way in; skip re-validating them
+    return [ResumeExtract.model_construct(**resume) for resume in resumes]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import ClassVar
+from typing import ClassVar, Optional
 
 class Settings(BaseSettings):
     APP_NAME: str = "Smart Resume Screener"
@@ -10,6 +10,35 @@ class Settings(BaseSettings):
     GEMINI_EMBEDDING_MODEL: str = "models/text-embedding-004"
     GEMINI_API_KEY: str
     EMBEDDING_DIMENSION: int = 768
+    # Resume/JD similarity embeddings: "local" runs MATCH_EMBEDDING_MODEL in-process,
+    # "gemini" calls the Gemini embedding API (also the fallback if the local model fails to load)
+    MATCH_EMBEDDING_PROVIDER: str = "local"
+    MATCH_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    # "int8" scores resume/JD similarity on symmetric int8 codes; "float32" is exact
+    MATCH_EMBEDDING_PRECISION: str = "float32"
+    # Both providers return unit vectors, so cosine is a dot product; this is verified on the
+    # first batch and the service falls back to normalizing if it does not hold
+    EMBEDDINGS_ARE_NORMALIZED: bool = True
+    # Upper bound on in-flight LLM requests so a large batch does not swamp the local Ollama server
+    LLM_MAX_CONCURRENCY: int = 8
+    # Shortlisted candidates scored per LLM prompt; 1 sends one prompt per candidate
+    LLM_BATCH_SIZE: int = 5
+    # Seconds a cached LLM match result / embedding stays valid
+    MATCH_CACHE_TTL: int = 86400
+    EMBEDDING_CACHE_TTL: int = 30 * 86400
+    # SentenceTransformer runtime for local models: "torch", "onnx" or "openvino".
+    # The non-torch backends need `pip install sentence-transformers[onnx]` / `[openvino]`.
+    EMBEDDING_BACKEND: str = "torch"
+    # Optional exported graph inside the model repo, e.g. "onnx/model_O3.onnx"
+    EMBEDDING_MODEL_FILE: Optional[str] = None
+    # Opt in to running the torch embedder in fp16 (CUDA) / bf16 (CPUs with AVX-512 BF16 or AMX);
+    # off by default since reduced precision shifts similarity scores slightly
+    EMBEDDING_HALF_PRECISION: bool = False
+    # Resumes rarely run past a few pages; stop PDF extraction after this many (0 = no limit)
+    MAX_RESUME_PAGES: int = 10
+    # Report keyword/experience analysis only reads this many leading characters of each resume
+    MAX_RESUME_CHARS_FOR_ANALYSIS: int = 8192
+    CACHE_DIR: str = "~/.cache/smart-resume-scanner"
 
     class Config:
         env_file = ".env"
@@ -1,15 +1,38 @@
+import asyncio
+import os
 import uvicorn
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from src.api.endpoints import router as api_router
-from src.config import Settings
+from src.config import settings
+from src.services.resume_parser import get_parser
+from src.services.match_engine import MatchEngine
+from src.services.pdf_generator import PDFReportGenerator
+from src.services.storage import storage_adapter
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services are built once per worker rather than as an import side effect; the parser
+    # loads spaCy and its embedder on first use
+    app.state.parser = get_parser()
+    app.state.matcher = MatchEngine()
+    await asyncio.to_thread(storage_adapter.ensure_vector_index, app.state.matcher.dimension)
+    app.state.pdf_generator = PDFReportGenerator()
+    # PDF/DOCX text extraction is pure-Python and CPU-bound; run it in worker processes
+    app.state.pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    yield
+    app.state.pool.shutdown(cancel_futures=True)
 
-settings = Settings()
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="A smart resume screening API using AI to parse resumes and match them against job descriptions.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -19,6 +42,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Resume payloads are mostly raw text and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/", tags=["Health Check"])
@@ -1,19 +1,25 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 
 class EducationItem(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     text: str
     start: Optional[str] = None
     end: Optional[str] = None
     confidence: float = 0.0
 
 class ExperienceItem(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     text: str
     start: Optional[str] = None
     end: Optional[str] = None
     confidence: float = 0.0
 
 class ResumeExtract(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     candidate_name: Optional[str] = Field(None, description="Detected candidate name")
     emails: List[str] = []
     phones: List[str] = []
@@ -30,11 +36,15 @@ class ResumeExtract(BaseModel):
     sections: Dict[str, str] = Field({}, description="Dictionary of detected sections and their content")
 
 class JobDescription(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     title: str
     description: str
     required_skills: List[str] = []
 
 class MatchOutput(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     candidate_name: str
     match_score: float
     strengths: List[str]
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import hashlib
+
+
+def content_hasher() -> "hashlib.blake2b":
+    """Incremental hasher producing the same digests as content_digest."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Small in-process LRU map; the least recently used entry is evicted first."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
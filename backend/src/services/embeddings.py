@@ -0,0 +1,64 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+from loguru import logger
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+@lru_cache(maxsize=None)
+def _cpu_has_native_bf16() -> bool:
+    """True when the CPU advertises AVX-512 BF16 or AMX-BF16 (Linux /proc/cpuinfo flags)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return bool({"avx512_bf16", "amx_bf16"} & set(line.split(":", 1)[1].split()))
+    except OSError:
+        pass
+    return False
+
+
+@lru_cache(maxsize=None)
+def load_embedder(
+    model: str, backend: str = "torch", model_file: Optional[str] = None, half_precision: bool = False
+) -> Tuple["SentenceTransformer", str]:
+    """Load a SentenceTransformer once per process. Returns (embedder, compute dtype)."""
+    # torch / sentence-transformers are imported here so importing this module stays cheap
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend != "torch":
+        # ONNX Runtime / OpenVINO run a fused, constant-folded graph instead of eager PyTorch
+        model_kwargs = {"file_name": model_file} if model_file else {}
+        if backend == "onnx":
+            model_kwargs["provider"] = "CPUExecutionProvider"
+        try:
+            return SentenceTransformer(model, backend=backend, model_kwargs=model_kwargs), "float32"
+        except Exception as e:
+            logger.warning(f"Failed to load '{model}' with {backend} backend, falling back to torch: {e}")
+    embedder = SentenceTransformer(model)
+    if not half_precision:
+        return embedder, "float32"
+    # fp16 on GPU tensor cores, bf16 on CPUs with native bf16 matmul (AVX-512 BF16 / AMX);
+    # elsewhere half precision is emulated and slower, so stay in fp32
+    if embedder.device.type == "cuda":
+        return embedder.half(), "float16"
+    if _cpu_has_native_bf16():
+        return embedder.to(torch.bfloat16), "bfloat16"
+    return embedder, "float32"
+
+
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization. Returns (codes, scales)."""
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def int8_dot(a_codes: np.ndarray, a_scales: np.ndarray, b_codes: np.ndarray, b_scales: np.ndarray) -> np.ndarray:
+    """Approximate a @ b.T from int8 codes, accumulating in int32."""
+    raw = np.dot(a_codes.astype(np.int32), b_codes.T.astype(np.int32))
+    return raw.astype(np.float32) * np.outer(a_scales, b_scales)
@@ -1,80 +1,485 @@
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, FrozenSet, Optional, Tuple
+import asyncio
+import math
+import os
+import re
 import numpy as np
-import google.generativeai as genai
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import orjson
+from diskcache import Cache
+from loguru import logger
 from src.config import settings
 from src.models.schemas import ResumeExtract, JobDescription, MatchOutput
+from src.services.cache import LRUCache, content_digest
+from src.services.embeddings import load_embedder, quantize_int8, int8_dot
+
+
+_TERM_RE = re.compile(r"[a-z0-9\+\#\.]+")
+_MAX_SKILL_WORDS = 4
+
+
+def _terms(text: str) -> List[str]:
+    return [token.strip(".") for token in _TERM_RE.findall(text.lower())]
+
+
+@lru_cache(maxsize=4096)
+def _skill_terms(skills: Tuple[str, ...]) -> Dict[str, str]:
+    """Normalized skill -> first spelling seen, memoized per resume skill list."""
+    terms = {}
+    for skill in skills:
+        terms.setdefault(" ".join(_terms(skill)), skill)
+    return terms
+
+
+@lru_cache(maxsize=64)
+def _job_terms(job_description_text: str) -> FrozenSet[str]:
+    """Every 1..4-word phrase of the job description, built once per JD."""
+    tokens = _terms(job_description_text)
+    return frozenset(
+        " ".join(tokens[i:i + n])
+        for n in range(1, _MAX_SKILL_WORDS + 1)
+        for i in range(len(tokens) - n + 1)
+    )
+
+
+_RECRUITER_BRIEF = """ROLE:
+Act as an expert AI Recruiter. Your job is to conduct a detailed, unbiased analysis of a candidate's resume compared to a given job description.
+
+CONTEXT:
+You will be provided with structured candidate data and a job description. Your analysis should clearly identify how well the candidate's skills, experience, and education align with the job requirements. The final output must be in valid JSON format only.
+
+TASK:
+1. Compare:
+   Carefully compare the candidate's details against the job description, focusing on:
+   - Required and preferred skills
+   - Relevant work experience and responsibilities
+   - Educational qualifications and certifications
+
+2. Score:
+   Assign a "match_score" between **0 and 100**, where 100 represents a perfect alignment with all major requirements.
+
+3. Analyze:
+   - Identify strengths where the candidate's profile directly matches the job description.
+   - Identify gaps where the candidate lacks required skills, experience, or education.
+
+4. Summarize:
+   Write a 2–3 sentence justification explaining the reasoning behind the assigned match score and overall fit."""
 
 
 class MatchEngine:
+    EMBED_BATCH_SIZE = 100
+    # Embedding models truncate at 256-512 tokens anyway; don't pay to send more
+    MAX_EMBED_CHARS = 2000
+    # Only the best candidates by embedding similarity are sent to the LLM for reranking
+    RERANK_FACTOR = 3
+    RERANK_LIMIT = 25
+
     def __init__(self):
+        # The Gemini and LangChain clients are slow to import; only pay for them once an engine is built
+        import google.generativeai as genai
+        from langchain_ollama import ChatOllama
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+
         genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.genai = genai
         self.embedding_model_name = settings.GEMINI_EMBEDDING_MODEL
         self.dimension = settings.EMBEDDING_DIMENSION
-        self.job_cache: Dict[str, List[float]] = {}
+        self.embedding_precision = settings.MATCH_EMBEDDING_PRECISION
+        self.normalize_embeddings = not settings.EMBEDDINGS_ARE_NORMALIZED
+        self._norm_checked = False
+        self.local_embedder = None
+        if settings.MATCH_EMBEDDING_PROVIDER == "local":
+            try:
+                self.local_embedder, _ = load_embedder(
+                    settings.MATCH_EMBEDDING_MODEL, settings.EMBEDDING_BACKEND,
+                    settings.EMBEDDING_MODEL_FILE, settings.EMBEDDING_HALF_PRECISION
+                )
+                self.embedding_model_name = settings.MATCH_EMBEDDING_MODEL
+                self.dimension = self.local_embedder.get_sentence_embedding_dimension()
+            except Exception as e:
+                logger.warning(f"Failed to load local embedding model, falling back to Gemini: {e}")
+        # Embeddings (job descriptions and resume summaries) keyed by model and content hash;
+        # the disk cache keeps them warm across restarts and worker processes
+        self.embedding_cache = LRUCache(maxsize=4096)
+        self.embedding_disk_cache = Cache(os.path.join(os.path.expanduser(settings.CACHE_DIR), "embeddings"))
+        # LLM match results keyed by resume, job description and models
+        self.result_cache = Cache(
+            os.path.join(os.path.expanduser(settings.CACHE_DIR), "match-results"), size_limit=2**30
+        )
 
         self.llm = ChatOllama(
             model=settings.OLLAMA_MODEL,
             temperature=0.3,
-            base_url="http://localhost:11434"
+            base_url="http://localhost:11434",
+            # Constrain decoding to JSON so the reply parses without cleanup
+            format="json"
         )
 
         self.prompt_template = ChatPromptTemplate.from_messages([
             ("system", "You are an expert recruiter. Analyze resumes and provide structured JSON output only."),
             ("user", "{input}")
         ])
-        self.parser = JsonOutputParser()
-        self.chain = self.prompt_template | self.llm | self.parser
+        self.chain = self.prompt_template | self.llm | StrOutputParser()
+        self.llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
 
     async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
-        result = await genai.embed_content_async(
+        if self.local_embedder is not None:
+            # Local inference is CPU/GPU-bound; keep it off the event loop
+            return await asyncio.to_thread(
+                self.local_embedder.encode, texts, batch_size=64, convert_to_numpy=True,
+                normalize_embeddings=True, show_progress_bar=False
+            )
+        result = await self.genai.embed_content_async(
             model=self.embedding_model_name,
             content=texts,
             task_type="RETRIEVAL_DOCUMENT"
         )
         return result["embedding"]
 
-    async def score_resume_against_job_text(
-        self, resume: ResumeExtract, job_description_text: str
+    def _pack(self, embedding: np.ndarray):
+        # In int8 mode cached vectors are kept as int8 codes plus a scale, a quarter of float32
+        if self.embedding_precision == "int8":
+            codes, scales = quantize_int8(embedding[None, :])
+            return codes[0], scales[0]
+        return embedding
+
+    @staticmethod
+    def _unpack(entry) -> np.ndarray:
+        if isinstance(entry, tuple):
+            codes, scale = entry
+            return codes.astype(np.float32) * scale
+        return entry
+
+    def _cached_embedding(self, key: tuple) -> Optional[np.ndarray]:
+        entry = self.embedding_cache.get(key)
+        if entry is None:
+            entry = self.embedding_disk_cache.get(key)
+            if entry is None:
+                return None
+            self.embedding_cache.put(key, entry)
+        return self._unpack(entry)
+
+    def _unit_rows(self, embeddings: np.ndarray) -> np.ndarray:
+        # Every cached or stored vector is unit length. Providers that already return
+        # unit vectors are checked on the first batch and then trusted.
+        if not self.normalize_embeddings:
+            if self._norm_checked:
+                return embeddings
+            if np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-3):
+                self._norm_checked = True
+                return embeddings
+            logger.warning("Embeddings are not unit length; normalizing them from now on")
+            self.normalize_embeddings = True
+        return embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+
+    async def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        keys = [(self.embedding_model_name, content_digest(text.encode())) for text in texts]
+        embeddings = [self._cached_embedding(key) for key in keys]
+        # Identical texts in one batch (e.g. re-uploaded resumes) are embedded once
+        missing: Dict[tuple, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], []).append(i)
+        pending = list(missing.values())
+        # The embedding API accepts at most 100 texts per request
+        for start in range(0, len(pending), self.EMBED_BATCH_SIZE):
+            batch = pending[start:start + self.EMBED_BATCH_SIZE]
+            batch_embeddings = self._unit_rows(
+                np.asarray(await self._embed_texts([texts[idx[0]] for idx in batch]), dtype=np.float32)
+            )
+            for indices, embedding in zip(batch, batch_embeddings):
+                entry = self._pack(embedding)
+                self.embedding_cache.put(keys[indices[0]], entry)
+                self.embedding_disk_cache.set(keys[indices[0]], entry, expire=settings.EMBEDDING_CACHE_TTL)
+                for i in indices:
+                    embeddings[i] = embedding
+        return embeddings
+
+    @classmethod
+    def _resume_summary(cls, resume: ResumeExtract) -> str:
+        return (f"Skills: {', '.join(resume.skills[:30])}. "
+                f"Experience: {' | '.join(resume.experience[:3])}. "
+                f"Education: {' | '.join(resume.education[:3])}")[:cls.MAX_EMBED_CHARS]
+
+    @staticmethod
+    def _cosine_scores(embeddings, job_emb) -> np.ndarray:
+        # Embeddings are unit length, so cosine similarity is the plain dot product
+        return np.asarray(embeddings, dtype=np.float32) @ job_emb
+
+    @staticmethod
+    def _int8_cosine_scores(embeddings, job_emb) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return int8_dot(*quantize_int8(embeddings), *quantize_int8(job_emb[None, :]))[:, 0]
+
+    @staticmethod
+    def base_scores(similarities):
+        """Map cosine similarity in [-1, 1] onto the 0-10 score scale (works element-wise)."""
+        return np.clip((similarities + 1) * 5, 0, 10)
+
+    async def embed_resume(self, resume: ResumeExtract) -> np.ndarray:
+        return (await self.embed_batch([self._resume_summary(resume)]))[0]
+
+    async def similarities(
+        self, resumes: List[ResumeExtract], job_description_text: str,
+        resume_embeddings: Optional[List[Optional[np.ndarray]]] = None
+    ) -> np.ndarray:
+        """Embed the job description and every resume summary in one batch and score them.
+
+        Entries of `resume_embeddings` that are not None are used as-is instead of re-embedding.
+        """
+        known = resume_embeddings or [None] * len(resumes)
+        missing = [i for i, emb in enumerate(known) if emb is None]
+        embeddings = await self.embed_batch(
+            [job_description_text[:self.MAX_EMBED_CHARS]] + [self._resume_summary(resumes[i]) for i in missing]
+        )
+        job_emb = embeddings.pop(0)
+        if not resumes:
+            return np.empty(0, dtype=np.float32)
+        if len(missing) < len(resumes):
+            computed, embeddings = embeddings, list(known)
+            for i, emb in zip(missing, computed):
+                embeddings[i] = emb
+        if self.embedding_precision == "int8":
+            return self._int8_cosine_scores(embeddings, job_emb)
+        # One (N, D) @ (D,) GEMV over the whole batch instead of a dot and two norms per resume
+        return self._cosine_scores(embeddings, job_emb)
+
+    @staticmethod
+    def _parse_llm_json(text: str) -> Dict[str, Any]:
+        # Slice to the outermost object in case the model wraps it in prose or fences
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end <= start:
+            return {}
+        try:
+            parsed = orjson.loads(text[start:end + 1])
+        except orjson.JSONDecodeError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+
+    @staticmethod
+    def _clean_verdict(verdict: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the well-typed fields of an LLM verdict; callers fall back on the rest."""
+        cleaned = {}
+        try:
+            score = float(verdict.get("match_score"))
+        except (TypeError, ValueError):
+            score = None
+        if score is not None and math.isfinite(score):
+            cleaned["match_score"] = score
+        for field in ("strengths", "gaps"):
+            value = verdict.get(field)
+            if isinstance(value, list):
+                cleaned[field] = [str(item) for item in value if isinstance(item, (str, int, float))]
+        if isinstance(verdict.get("justification"), str):
+            cleaned["justification"] = verdict["justification"]
+        return cleaned
+
+    def rerank_shortlist(self, similarities: np.ndarray, top_k: int) -> np.ndarray:
+        """Indices of the candidates worth an LLM call, best similarity first."""
+        k = min(self.RERANK_FACTOR * top_k, self.RERANK_LIMIT, len(similarities))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        idx = np.argpartition(-similarities, k - 1)[:k]
+        return idx[np.argsort(-similarities[idx], kind="stable")]
+
+    def score_without_llm(
+        self, resume: ResumeExtract, job_description_text: str, similarity: float
     ) -> MatchOutput:
+        """Cheap similarity-only scoring for candidates that did not make the LLM shortlist."""
+        base_score = float(self.base_scores(similarity))
+        skill_terms = _skill_terms(tuple(resume.skills))
+        hits = skill_terms.keys() & _job_terms(job_description_text)
+        matched = [skill for term, skill in skill_terms.items() if term in hits]
+        return MatchOutput(
+            candidate_name=resume.candidate_name or "Unknown",
+            match_score=round(base_score, 2),
+            strengths=matched[:5] or resume.skills[:3],
+            gaps=[] if matched else ["Few of the candidate's skills appear in the job description"],
+            justification=f"Candidate shows {base_score:.1f}/10 alignment with the role.",
+            details={"similarity": float(similarity), "base_score": base_score}
+        )
+
+    async def score_batch(
+        self, resumes: List[ResumeExtract], job_description_text: str, top_k: int,
+        resume_embeddings: Optional[List[Optional[np.ndarray]]] = None
+    ) -> List[Tuple[int, MatchOutput]]:
+        """Score many resumes against one JD; returns (resume index, result) best first.
+
+        The JD is embedded once, only the similarity shortlist goes to the LLM (LLM_BATCH_SIZE
+        candidates per prompt, concurrently, bounded by the LLM semaphore) and LLM-scored
+        candidates rank ahead of the rest. Shortlisted resumes whose LLM call fails are
+        logged, scored on similarity alone and ranked after the LLM-scored ones.
+        """
+        similarities = await self.similarities(resumes, job_description_text, resume_embeddings)
+        shortlist = self.rerank_shortlist(similarities, top_k).tolist()
+
+        scored = {}
+        pending = []
+        for i in shortlist:
+            cached = self.result_cache.get(self._result_key(resumes[i], job_description_text))
+            if cached is not None:
+                scored[i] = MatchOutput(**cached)
+            else:
+                pending.append(i)
+
+        batch_size = settings.LLM_BATCH_SIZE
+        if batch_size > 1 and len(pending) > 1:
+            chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+            verdicts = await asyncio.gather(*[
+                self.score_batch_llm([resumes[i] for i in chunk], job_description_text) for chunk in chunks
+            ], return_exceptions=True)
+            for chunk, chunk_verdicts in zip(chunks, verdicts):
+                if isinstance(chunk_verdicts, BaseException):
+                    logger.warning(f"Batched LLM scoring failed, scoring {len(chunk)} resumes one by one: {chunk_verdicts}")
+                    continue
+                for i, verdict in zip(chunk, chunk_verdicts):
+                    # A skipped or malformed verdict stays pending for a single-candidate prompt
+                    verdict = self._clean_verdict(verdict)
+                    if "match_score" in verdict:
+                        scored[i] = self._match_output(resumes[i], job_description_text, verdict, similarities[i])
+            pending = [i for i in pending if i not in scored]
+
+        # Single-candidate prompts for everything the batched path did not cover
+        results = await asyncio.gather(*[
+            self.score_resume_against_job_text(resumes[i], job_description_text, similarities[i])
+            for i in pending
+        ], return_exceptions=True)
+        failed = set()
+        for i, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                # Keep the candidate, ranked on similarity alone, rather than dropping the best matches
+                logger.error(f"Failed to score resume {i} ({resumes[i].candidate_name}), using similarity only: {result}")
+                result = self.score_without_llm(resumes[i], job_description_text, similarities[i])
+                failed.add(i)
+            scored[i] = result
+
+        reranked = [(i, scored[i]) for i in shortlist if i not in failed]
+        reranked.sort(key=lambda x: x[1].match_score, reverse=True)
+        # Similarity-only scores are on a different scale, so LLM failures rank after every LLM
+        # verdict; the shortlist is already in similarity order
+        unranked = [(i, scored[i]) for i in shortlist if i in failed]
 
-        resume_summary = f"Skills: {', '.join(resume.skills)}. " \
-                         f"Experience: {', '.join(resume.experience[:2])}. " \
-                         f"Education: {', '.join(resume.education[:2])}"
+        shortlisted = set(shortlist)
+        remaining = [
+            (i, self.score_without_llm(resumes[i], job_description_text, similarities[i]))
+            for i in np.argsort(-similarities, kind="stable").tolist() if i not in shortlisted
+        ]
+        return reranked + unranked + remaining
 
-        job_emb = (await self._embed_texts([job_description_text]))[0]
-        resume_emb = (await self._embed_texts([resume_summary]))[0]
-        similarity = np.dot(job_emb, resume_emb) / (
-            np.linalg.norm(job_emb) * np.linalg.norm(resume_emb)
+    def _result_key(self, resume: ResumeExtract, job_description_text: str) -> tuple:
+        return (
+            content_digest(resume.raw_text.encode()), content_digest(job_description_text.encode()),
+            settings.OLLAMA_MODEL, self.embedding_model_name
         )
 
-        base_score = float(np.clip((similarity + 1) * 5, 0, 10))
+    def _match_output(
+        self, resume: ResumeExtract, job_description_text: str, parsed: Dict[str, Any], similarity: float
+    ) -> MatchOutput:
+        """Postprocess one LLM verdict into a MatchOutput and cache it."""
+        parsed = self._clean_verdict(parsed)
+        base_score = float(self.base_scores(similarity))
+        strengths = parsed.get("strengths", resume.skills[:3])
+        gaps = parsed.get("gaps", ["More relevant experience needed"])
+        justification = parsed.get(
+            "justification",
+            f"Candidate shows {base_score:.1f}/10 alignment with the role."
+        )
+
+        # Handle both 0–100 or 0–10 scales
+        llm_score = float(parsed.get("match_score", base_score))
+        if llm_score > 10:
+            llm_score /= 10
+
+        final_score = np.clip(llm_score, 0.0, 10.0)
+
+        result = MatchOutput(
+            candidate_name=resume.candidate_name or "Unknown",
+            match_score=round(final_score, 2),
+            strengths=strengths[:5],
+            gaps=gaps[:5],
+            justification=justification,
+            details={"similarity": float(similarity), "base_score": base_score}
+        )
+        # An unparseable reply falls back to defaults; don't pin that fallback for a day
+        if "match_score" in parsed:
+            self.result_cache.set(
+                self._result_key(resume, job_description_text), result.model_dump(), expire=settings.MATCH_CACHE_TTL
+            )
+        return result
+
+    async def score_batch_llm(self, resumes: List[ResumeExtract], job_description_text: str) -> List[Dict[str, Any]]:
+        """One LLM call scoring several resumes against the same JD.
+
+        Returns the raw verdict for each resume in order; a resume the model skipped gets {}.
+        """
+        payload = orjson.dumps({
+            "job": job_description_text,
+            "candidates": [{
+                "id": idx,
+                "name": resume.candidate_name,
+                "skills": resume.skills,
+                "experience": resume.experience[:3],
+                "education": resume.education
+            } for idx, resume in enumerate(resumes)]
+        }).decode()
 
         prompt_content = f"""
-ROLE:
-Act as an expert AI Recruiter. Your job is to conduct a detailed, unbiased analysis of a candidate's resume compared to a given job description.
+{_RECRUITER_BRIEF}
 
-CONTEXT:
-You will be provided with structured candidate data and a job description. Your analysis should clearly identify how well the candidate's skills, experience, and education align with the job requirements. The final output must be in valid JSON format only.
+Evaluate each candidate independently against the same job description.
 
-TASK:
-1. Compare:
-   Carefully compare the candidate's details against the job description, focusing on:
-   - Required and preferred skills
-   - Relevant work experience and responsibilities
-   - Educational qualifications and certifications
+INPUTS (JSON, one entry per candidate):
+{payload}
 
-2. Score:
-   Assign a "match_score" between **0 and 100**, where 100 represents a perfect alignment with all major requirements.
+OUTPUT FORMAT:
+Respond with a single valid JSON object only.
+Do not include markdown, comments, or text outside the JSON.
+Return exactly one entry per candidate, using the candidate's "id".
 
-3. Analyze:
-   - Identify strengths where the candidate's profile directly matches the job description.
-   - Identify gaps where the candidate lacks required skills, experience, or education.
+JSON SCHEMA:
+{{
+  "results": [
+    {{
+      "id": "<candidate id>",
+      "match_score": "<integer between 0 and 100>",
+      "strengths": ["strength1", "strength2", "strength3"],
+      "gaps": ["gap1", "gap2"],
+      "justification": "<2-3 sentences explaining the overall match and reasoning behind the score>"
+    }}
+  ]
+}}
+        """.strip()
 
-4. Summarize:
-   Write a 2–3 sentence justification explaining the reasoning behind the assigned match score and overall fit.
+        async with self.llm_semaphore:
+            parsed = self._parse_llm_json(await self.chain.ainvoke({"input": prompt_content}))
+
+        verdicts = [{} for _ in resumes]
+        results = parsed.get("results")
+        for verdict in results if isinstance(results, list) else []:
+            if not isinstance(verdict, dict):
+                continue
+            try:
+                idx = int(verdict.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < len(resumes):
+                verdicts[idx] = verdict
+        return verdicts
+
+    async def score_resume_against_job_text(
+        self, resume: ResumeExtract, job_description_text: str, similarity: Optional[float] = None
+    ) -> MatchOutput:
+
+        cached = self.result_cache.get(self._result_key(resume, job_description_text))
+        if cached is not None:
+            return MatchOutput(**cached)
+
+        if similarity is None:
+            similarity = (await self.similarities([resume], job_description_text))[0]
+
+        prompt_content = f"""
+{_RECRUITER_BRIEF}
 
 INPUTS:
 CANDIDATE:
@@ -100,32 +505,11 @@ JSON SCHEMA:
         """.strip()
 
         # 🔹 Run through Ollama model
-        parsed = await self.chain.ainvoke({"input": prompt_content})
+        async with self.llm_semaphore:
+            parsed = self._parse_llm_json(await self.chain.ainvoke({"input": prompt_content}))
 
-        # 🔹 Parse and postprocess safely
-        strengths = parsed.get("strengths", resume.skills[:3])
-        gaps = parsed.get("gaps", ["More relevant experience needed"])
-        justification = parsed.get(
-            "justification",
-            f"Candidate shows {base_score:.1f}/10 alignment with the role."
-        )
-
-        # Handle both 0–100 or 0–10 scales
-        llm_score = float(parsed.get("match_score", base_score))
-        if llm_score > 10:
-            llm_score /= 10
-
-        final_score = np.clip(llm_score, 0.0, 10.0)
+        return self._match_output(resume, job_description_text, parsed, similarity)
 
-        # 🔹 Construct and return structured MatchOutput
-        return MatchOutput(
-            candidate_name=resume.candidate_name or "Unknown",
-            match_score=round(final_score, 2),
-            strengths=strengths[:5],
-            gaps=gaps[:5],
-            justification=justification,
-            details={"similarity": float(similarity), "base_score": base_score}
-        )
     async def score_candidate_against_job(
         self, resume: ResumeExtract, job: JobDescription
     ) -> MatchOutput:
@@ -1,58 +1,136 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor, black
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.enums import TA_CENTER
 from datetime import datetime
 import re
-from typing import List, Dict, Any
+import string
+from functools import lru_cache
+from typing import List, Dict, Any, FrozenSet
 from io import BytesIO
+from src.config import settings
+
+PROJECT_KEYWORDS = ['project', 'developed', 'built', 'implemented', 'designed', 'deployed', 'led', 'created']
+EDUCATION_KEYWORDS = ['btech', 'b.e', 'bachelor', 'mtech', 'm.sc', 'phd', 'degree', 'university', 'college']
+# One compiled alternation per keyword list: a single scan per line instead of one substring search per keyword
+_PROJECT_RE = re.compile("|".join(map(re.escape, PROJECT_KEYWORDS)), re.IGNORECASE)
+_EDUCATION_RE = re.compile("|".join(map(re.escape, EDUCATION_KEYWORDS)), re.IGNORECASE)
+
+_GITHUB_RE = re.compile(r'(?:https?://)?(?:www\.)?github\.com/[^\s,]+', re.IGNORECASE)
+_GITHUB_ALT_RE = re.compile(r'github\s*[:\-]?\s*([\w\-/\.]+)', re.IGNORECASE)
+_LINKEDIN_RE = re.compile(r'(?:https?://)?(?:www\.)?linkedin\.com/in/[^\s,]+', re.IGNORECASE)
+_LINKEDIN_ALT_RE = re.compile(r'linkedin\s*[:\-]?\s*([\w\-/\.]+)', re.IGNORECASE)
+# Portfolio / website detection (avoid false positives)
+_PORTFOLIO_RE = re.compile(r'(?:https?://)?(?:www\.)?(?!linkedin|github)[\w-]+\.(?:com|net|io|dev|me)(?:/[^\s]*)?', re.IGNORECASE)
+# Experience detection (handles "3+ years", "worked for 2 years", etc.)
+_EXPERIENCE_RE = re.compile(r'(\d+)\s*(?:\+?\s*)?(?:years?|yrs?).*(?:experience|work|industry)?', re.IGNORECASE)
+_KEYWORD_RE = re.compile(r'\b[A-Za-z0-9\+\#\.]{2,}\b')
+_KEYWORD_CHARS = string.ascii_letters + string.digits + '+#.'
+_KEYWORD_TRANS = str.maketrans({c: ' ' for c in map(chr, range(128)) if c not in _KEYWORD_CHARS})
+
+
+
+def _keyword_tokens(text: str) -> List[str]:
+    """Same tokens as _KEYWORD_RE.findall(text).
+
+    For ASCII text without underscores the word boundaries reduce to runs of keyword characters
+    with leading/trailing '+#.' stripped, which str.translate + split finds without the regex engine.
+    """
+    if text.isascii() and '_' not in text:
+        return [token for token in (chunk.strip('+#.') for chunk in text.translate(_KEYWORD_TRANS).split())
+                if len(token) >= 2]
+    return _KEYWORD_RE.findall(text)
+
+
+def _count_matching_lines(pattern: re.Pattern, text: str) -> int:
+    """Lines of text containing a match, found by searching the whole text instead of line by line.
+
+    After a hit the scan resumes at the next line, so the rest of a matching line is skipped.
+    """
+    count = pos = 0
+    while match := pattern.search(text, pos):
+        count += 1
+        pos = text.find('\n', match.end()) + 1
+        if not pos:
+            break
+    return count
+
+
+@lru_cache(maxsize=None)
+def _report_styles():
+    """Paragraph and table styles, built on first use so importing this module skips reportlab."""
+    from reportlab import rl_config
+    from reportlab.lib.colors import HexColor, black
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    # Deterministic output (no per-build timestamps / random document IDs)
+    rl_config.invariant = 1
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=HexColor('#1e40af'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='SectionHeader',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=HexColor('#4338ca'),
+        spaceAfter=12,
+        spaceBefore=12,
+        fontName='Helvetica-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CandidateName',
+        parent=styles['Heading3'],
+        fontSize=12,
+        textColor=HexColor('#374151'),
+        spaceAfter=6,
+        fontName='Helvetica-Bold'
+    ))
+
+    # Table styles are identical for every candidate
+    link_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), HexColor('#f3f4f6')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#d1d5db'))
+    ])
+
+    detail_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), HexColor('#eef2ff')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#c7d2fe'))
+    ])
+    return styles, link_table_style, detail_table_style
 
 
 class PDFReportGenerator:
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
-
-    def _setup_custom_styles(self):
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=HexColor('#1e40af'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='SectionHeader',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            textColor=HexColor('#4338ca'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='CandidateName',
-            parent=self.styles['Heading3'],
-            fontSize=12,
-            textColor=HexColor('#374151'),
-            spaceAfter=6,
-            fontName='Helvetica-Bold'
-        ))
+    @property
+    def styles(self):
+        # Shared, read-only paragraph styles
+        return _report_styles()[0]
 
     # ✅ Smarter link extractor (handles partial URLs and text-only mentions)
     def _extract_links(self, text: str) -> Dict[str, str]:
         links = {}
 
         # GitHub detection (handles "github.com/username" or "GitHub: username")
-        github_match = re.search(r'(?:https?://)?(?:www\.)?github\.com/[^\s,]+', text, re.IGNORECASE)
+        github_match = _GITHUB_RE.search(text)
         if not github_match:
-            github_alt = re.search(r'github\s*[:\-]?\s*([\w\-/\.]+)', text, re.IGNORECASE)
+            github_alt = _GITHUB_ALT_RE.search(text)
             if github_alt:
                 username = github_alt.group(1).replace(" ", "").strip('/')
                 gh_url = f"https://github.com/{username}" if "github.com" not in username else f"https://{username}"
@@ -64,9 +142,9 @@ class PDFReportGenerator:
             links['GitHub'] = gh_url
 
         # LinkedIn detection (handles both direct URLs and partial)
-        linkedin_match = re.search(r'(?:https?://)?(?:www\.)?linkedin\.com/in/[^\s,]+', text, re.IGNORECASE)
+        linkedin_match = _LINKEDIN_RE.search(text)
         if not linkedin_match:
-            linkedin_alt = re.search(r'linkedin\s*[:\-]?\s*([\w\-/\.]+)', text, re.IGNORECASE)
+            linkedin_alt = _LINKEDIN_ALT_RE.search(text)
             if linkedin_alt:
                 li = linkedin_alt.group(1).replace(" ", "").strip('/')
                 li_url = f"https://linkedin.com/in/{li}" if "linkedin.com" not in li else f"https://{li}"
@@ -77,9 +155,7 @@ class PDFReportGenerator:
                 li_url = "https://" + li_url
             links['LinkedIn'] = li_url
 
-        # Portfolio / website detection (avoid false positives)
-        portfolio_pattern = r'(?:https?://)?(?:www\.)?(?!linkedin|github)[\w-]+\.(?:com|net|io|dev|me)(?:/[^\s]*)?'
-        portfolio_match = re.search(portfolio_pattern, text, re.IGNORECASE)
+        portfolio_match = _PORTFOLIO_RE.search(text)
         if portfolio_match:
             link = portfolio_match.group(0)
             if not link.startswith("http"):
@@ -89,33 +165,30 @@ class PDFReportGenerator:
         return links
 
     # 🔍 Detailed analysis (more accurate experience/project parsing)
-    def _generate_detailed_analysis(self, resume_text: str, job_description: str) -> Dict[str, str]:
+    @staticmethod
+    def _keywords(text: str) -> FrozenSet[str]:
+        return frozenset(_keyword_tokens(text.lower()))
+
+    def _generate_detailed_analysis(self, resume_text: str, jd_keywords: FrozenSet[str]) -> Dict[str, str]:
         """Extract deeper insights from résumé text and job description."""
         analysis = {}
+        # The signal is up front; trailing references/boilerplate only cost scan time
+        resume_text = resume_text[:settings.MAX_RESUME_CHARS_FOR_ANALYSIS]
 
-        # Experience detection (handles "3+ years", "worked for 2 years", etc.)
-        exp_pattern = r'(\d+)\s*(?:\+?\s*)?(?:years?|yrs?).*(?:experience|work|industry)?'
-        exp_matches = re.findall(exp_pattern, resume_text, re.IGNORECASE)
+        exp_matches = _EXPERIENCE_RE.findall(resume_text)
         total_exp = max(map(int, exp_matches)) if exp_matches else 0
         analysis['Experience'] = f"{total_exp} years of experience detected." if total_exp else "Experience details not clearly stated."
 
-        # Project mentions
-        project_keywords = ['project', 'developed', 'built', 'implemented', 'designed', 'deployed', 'led', 'created']
-        project_lines = [line for line in resume_text.split('\n') if any(k in line.lower() for k in project_keywords)]
-        project_count = len(project_lines)
+        project_count = _count_matching_lines(_PROJECT_RE, resume_text)
+        edu_count = _count_matching_lines(_EDUCATION_RE, resume_text)
         analysis['Projects'] = f"{project_count} project(s) mentioned." if project_count else "No clear project mentions found."
 
         # Skill overlap (JD vs résumé)
-        jd_keywords = set(re.findall(r'\b[A-Za-z0-9\+\#\.]{2,}\b', job_description.lower()))
-        resume_keywords = set(re.findall(r'\b[A-Za-z0-9\+\#\.]{2,}\b', resume_text.lower()))
-        overlap = jd_keywords.intersection(resume_keywords)
+        overlap = jd_keywords.intersection(_keyword_tokens(resume_text.lower()))
         overlap_ratio = (len(overlap) / len(jd_keywords)) * 100 if jd_keywords else 0
         analysis['Skill Match'] = f"~{overlap_ratio:.1f}% overlap between resume and job description skills."
 
-        # Education info
-        education_keywords = ['btech', 'b.e', 'bachelor', 'mtech', 'm.sc', 'phd', 'degree', 'university', 'college']
-        edu_lines = [line for line in resume_text.split('\n') if any(k in line.lower() for k in education_keywords)]
-        analysis['Education'] = f"{len(edu_lines)} educational qualification(s) detected." if edu_lines else "Education info not found."
+        analysis['Education'] = f"{edu_count} educational qualification(s) detected." if edu_count else "Education info not found."
 
         return analysis
 
@@ -125,6 +198,11 @@ class PDFReportGenerator:
         candidates: List[Dict[str, Any]],
         resume_texts: Dict[str, str]
     ) -> BytesIO:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+
+        _, link_table_style, detail_table_style = _report_styles()
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
         story = []
@@ -151,7 +229,8 @@ class PDFReportGenerator:
         story.append(Paragraph(summary_text, self.styles['Normal']))
         story.append(PageBreak())
 
-        # Per-Candidate Details
+        # Per-Candidate Details; the JD is tokenized once for every candidate's overlap check
+        jd_keywords = self._keywords(job_description)
         for idx, candidate in enumerate(candidates, 1):
             story.append(Paragraph(f"Candidate #{idx}: {candidate['candidate_name']}", self.styles['SectionHeader']))
 
@@ -171,16 +250,7 @@ class PDFReportGenerator:
                 story.append(Paragraph("<b>Professional Links:</b>", self.styles['CandidateName']))
                 link_data = [[platform, f'<link href="{url}">{url}</link>'] for platform, url in links.items()]
                 link_table = Table(link_data, colWidths=[1.5 * inch, 5 * inch])
-                link_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), HexColor('#f3f4f6')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#d1d5db'))
-                ]))
+                link_table.setStyle(link_table_style)
                 story.append(link_table)
                 story.append(Spacer(1, 0.15 * inch))
 
@@ -191,29 +261,23 @@ class PDFReportGenerator:
 
             # Strengths
             story.append(Paragraph("<b>Key Strengths:</b>", self.styles['CandidateName']))
-            for strength in candidate['strengths']:
-                story.append(Paragraph(f"• {strength}", self.styles['Normal']))
+            # One paragraph per list, so the markup parser runs once per section instead of once per bullet
+            if candidate['strengths']:
+                story.append(Paragraph("<br/>".join(f"• {s}" for s in candidate['strengths']), self.styles['Normal']))
             story.append(Spacer(1, 0.15 * inch))
 
             # Gaps
             story.append(Paragraph("<b>Areas for Development:</b>", self.styles['CandidateName']))
-            for gap in candidate['gaps']:
-                story.append(Paragraph(f"• {gap}", self.styles['Normal']))
+            if candidate['gaps']:
+                story.append(Paragraph("<br/>".join(f"• {g}" for g in candidate['gaps']), self.styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
 
             # Detailed Analysis
             story.append(Paragraph("<b>Detailed Analysis:</b>", self.styles['CandidateName']))
-            detailed = self._generate_detailed_analysis(resume_text, job_description)
+            detailed = self._generate_detailed_analysis(resume_text, jd_keywords)
             detail_table = [[k, v] for k, v in detailed.items()]
             detail_table_obj = Table(detail_table, colWidths=[1.5 * inch, 5 * inch])
-            detail_table_obj.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), HexColor('#eef2ff')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#c7d2fe'))
-            ]))
+            detail_table_obj.setStyle(detail_table_style)
             story.append(detail_table_obj)
 
             if idx < len(candidates):
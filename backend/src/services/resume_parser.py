@@ -1,212 +1,525 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from functools import cached_property, lru_cache
+from collections import defaultdict
+from src.config import settings
 from src.models.schemas import ResumeExtract
+from src.services.embeddings import load_embedder, quantize_int8, int8_dot
+from src.services.cache import LRUCache, content_digest
+from diskcache import Cache
 import io
 import re
-import spacy
+import pymupdf
 from pdfminer.high_level import extract_text as pdf_extract_text
 from docx import Document
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import json
 import requests
 from loguru import logger
 import os
-import importlib.util
+import time
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.py")
-spec = importlib.util.spec_from_file_location("config", CONFIG_PATH)
-config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(config)
+# Local SentenceTransformer for ontology matching; the same model as the default
+# MATCH_EMBEDDING_MODEL, so the parser and match engine share one loaded instance
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = settings.EMBEDDING_BACKEND
+EMBEDDING_MODEL_FILE = settings.EMBEDDING_MODEL_FILE
+EMBEDDING_HALF_PRECISION = settings.EMBEDDING_HALF_PRECISION
+MAX_RESUME_PAGES = settings.MAX_RESUME_PAGES
+CACHE_DIR = os.path.expanduser(settings.CACHE_DIR)
+ONTOLOGY_TTL = 86400
+ONTOLOGY_TIMEOUT = 5
+
+# Keep-alive connection pool shared by every ontology download in the process
+_HTTP = requests.Session()
+
+def extract_pdf_text(content: bytes, maxpages: int = 0) -> str:
+    # MuPDF extracts text in C; pdfminer is kept for the odd PDF that MuPDF rejects or finds no text in
+    try:
+        with pymupdf.open(stream=content, filetype="pdf") as doc:
+            pages = doc.pages(0, min(maxpages, doc.page_count)) if maxpages else doc
+            text = "\n".join(page.get_text("text") for page in pages)
+    except Exception as e:
+        logger.warning(f"MuPDF failed to read PDF, falling back to pdfminer: {e}")
+        text = ""
+    if not text.strip():
+        text = pdf_extract_text(io.BytesIO(content), maxpages=maxpages)
+    return text
+
+
+def download_ontology(url: str) -> list:
+    """GET a JSON ontology through a disk cache shared by all workers.
+
+    Copies younger than ONTOLOGY_TTL are used as-is; older ones are revalidated with
+    their ETag / Last-Modified so an unchanged ontology is not downloaded again, and are
+    kept as they are when revalidation fails.
+    """
+    with Cache(os.path.join(CACHE_DIR, "ontologies")) as cache:
+        cached = cache.get(url)
+        if cached is not None and time.time() - cached["fetched_at"] < ONTOLOGY_TTL:
+            return cached["data"]
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            resp = _HTTP.get(url, headers=headers, timeout=ONTOLOGY_TIMEOUT)
+            if resp.status_code != 304 or cached is None:
+                resp.raise_for_status()
+        except requests.RequestException as e:
+            if cached is None:
+                raise
+            # A stale copy beats falling back to the default ontology, which would also
+            # change the parser id and invalidate every cached extract
+            logger.warning(f"Could not revalidate ontology {url}, using the cached copy: {e}")
+            return cached["data"]
+        data = cached["data"] if resp.status_code == 304 and cached is not None else json.loads(resp.text)
+        cache.set(url, {
+            "data": data,
+            "etag": resp.headers.get("ETag", cached and cached["etag"]),
+            "last_modified": resp.headers.get("Last-Modified", cached and cached["last_modified"]),
+            "fetched_at": time.time()
+        })
+        return data
+
+
+def extract_text(content: bytes, filename: str) -> str:
+    # Module-level so it can be shipped to a process pool without the parser's models
+    ext = filename.split('.')[-1].lower()
+    text = ""
+    try:
+        if ext == "pdf":
+            text = extract_pdf_text(content, maxpages=MAX_RESUME_PAGES)
+        elif ext == "docx":
+            doc = Document(io.BytesIO(content))
+            text = "\n".join([p.text for p in doc.paragraphs])
+        elif ext == "txt":
+            text = content.decode(errors='ignore')
+        else:
+            logger.warning(f"Unsupported file type: {ext}. Returning empty text.")
+    except Exception as e:
+        logger.error(f"Failed to parse file {filename}: {e}")
+    return text
+
+
+_EMAIL_RE = re.compile(r"[\w\.\-]+@[\w\.\-]+")
+# Non-capturing so findall yields whole numbers rather than the country-code group
+_PHONE_RE = re.compile(r"(?:\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}")
 
-GEMINI_EMBEDDING_MODEL = getattr(config, "GEMINI_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
 class ResumeParser:
+    _TOKEN_RE = re.compile(r"[a-z0-9\+\#\.]+")
+
+    _SECTION_KEYWORDS = {
+        "Education": ["education"],
+        "Work Experience": ["work experience", "employment history", "professional experience"],
+        "Technical Skills": ["technical skills", "skills"],
+        "Projects": ["projects"],
+        "Achievements and Responsibilities": ["achievements and responsibilities", "achievements", "honors", "awards"],
+        "Certifications": ["certifications", "licenses"],
+        "Publications": ["publications"],
+        "Languages": ["languages"],
+        "Interests": ["interests", "hobbies"]
+    }
+    # Flat heading -> section lookup so each line costs one dict probe
+    _SECTION_BY_KEYWORD = {kw: sec for sec, kws in _SECTION_KEYWORDS.items() for kw in kws}
+    _NAME_HEADER_LINES = 8
+    _NAME_HEADER_CHARS = 1000
+    _ONTOLOGY_BLOCK = 4096
+
     def __init__(
         self,
         skill_source: Optional[str] = None,
         cert_source: Optional[str] = None,
         nlp_model: str = "en_core_web_sm",
-        embedding_model: str = GEMINI_EMBEDDING_MODEL
+        embedding_model: str = EMBEDDING_MODEL,
+        ontology_precision: str = "float32",
+        embedding_backend: str = EMBEDDING_BACKEND,
+        embedding_model_file: Optional[str] = EMBEDDING_MODEL_FILE,
+        nlp_batch_size: int = 32,
+        nlp_n_process: int = 1
     ):
+        # spaCy, the embedder and the ontology embeddings load on first use (see the
+        # cached properties below), so regex-only callers never pay for them
+        self._nlp_model = nlp_model
+        self._embedding_config = (embedding_model, embedding_backend, embedding_model_file, EMBEDDING_HALF_PRECISION)
+        # n_process > 1 forks spaCy workers per call; only worth it for large offline batches
+        self.nlp_batch_size = nlp_batch_size
+        self.nlp_n_process = nlp_n_process
+        self.skills_list = self._load_ontology(skill_source, default_type="skills")
+        self.cert_list = self._load_ontology(cert_source, default_type="certifications")
+        # Lowercased once for the substring fallback in _semantic_match
+        self._skills_lower = self._lowered_ontology(self.skills_list)
+        self._certs_lower = self._lowered_ontology(self.cert_list)
+        self.ontology_precision = ontology_precision
+        self._skill_token_index = self._build_token_index(self.skills_list)
+        self._cert_token_index = self._build_token_index(self.cert_list)
+        # Parsed extracts keyed by a digest of the uploaded bytes: an in-process LRU in front
+        # of a disk cache that survives restarts. Disk entries are also keyed by the parser
+        # configuration, since a different model or ontology produces different extracts.
+        self.extract_cache = LRUCache(maxsize=1024)
+        self.extract_disk_cache = Cache(os.path.join(CACHE_DIR, "extracts"), size_limit=512 << 20)
+        self._parser_id = content_digest(json.dumps(
+            [self._embedding_config, ontology_precision, self.skills_list, self.cert_list]
+        ).encode())
+
+    @cached_property
+    def nlp(self):
+        import spacy
         try:
-            self.nlp = spacy.load(nlp_model)
+            # Only NER is used (for candidate names); skip the rest of the pipeline
+            nlp = spacy.load(self._nlp_model, disable=["tagger", "parser", "lemmatizer", "attribute_ruler"])
         except OSError:
-            logger.error(f"Spacy model '{nlp_model}' not found. Please run 'python -m spacy download {nlp_model}'")
+            logger.error(f"Spacy model '{self._nlp_model}' not found. Please run 'python -m spacy download {self._nlp_model}'")
             raise
-        self.skills_list = self._load_ontology(skill_source, default_type="skills")
-        self.cert_list = self._load_ontology(cert_source, default_type="certifications")
-        self.embedder = SentenceTransformer(embedding_model)
-        self.skill_embeddings = self.embedder.encode(self.skills_list, normalize_embeddings=True)
-        self.cert_embeddings = self.embedder.encode(self.cert_list, normalize_embeddings=True)
+        # The sm/md pipelines give NER its own embedded tok2vec; the shared one only feeds
+        # the disabled tagger/parser
+        if "tok2vec" in nlp.pipe_names and "ner" not in nlp.get_pipe("tok2vec").listening_components:
+            nlp.disable_pipe("tok2vec")
+        return nlp
 
-    def parse_bytes(self, content: bytes, filename: str) -> ResumeExtract:
-        ext = filename.split('.')[-1].lower()
-        text = ""
+    @cached_property
+    def _loaded_embedder(self):
+        return load_embedder(*self._embedding_config)
+
+    @property
+    def embedder(self):
+        return self._loaded_embedder[0]
+
+    @property
+    def embedding_dtype(self) -> str:
+        return self._loaded_embedder[1]
+
+    @cached_property
+    def embedding_dim(self) -> int:
+        return self.embedder.get_sentence_embedding_dimension()
+
+    @cached_property
+    def _embedder_id(self) -> list:
+        return [*self._embedding_config[:3], self.embedding_dtype]
+
+    @cached_property
+    def skill_embeddings(self):
+        return self._prepare_ontology_embeddings(self.skills_list)
+
+    @cached_property
+    def cert_embeddings(self):
+        return self._prepare_ontology_embeddings(self.cert_list)
+
+    @staticmethod
+    def _lowered_ontology(ontology: List[str]) -> List[Optional[str]]:
+        # An entry spanning lines can never be inside a single candidate line
+        return [None if "\n" in item else item.lower() for item in ontology]
+
+    def _prepare_ontology_embeddings(self, ontology: List[str]):
+        # Contiguous float32 so the similarity matmul dispatches to BLAS SGEMM
+        embeddings = np.ascontiguousarray(self._load_ontology_embeddings(ontology), dtype=np.float32)
+        if self.ontology_precision == "int8":
+            return quantize_int8(embeddings)
+        if self.ontology_precision == "float16":
+            # Half the resident size; blocks are widened back to float32 for the matmul
+            return embeddings.astype(np.float16)
+        return embeddings
+
+    def _load_ontology_embeddings(self, ontology: List[str]) -> np.ndarray:
+        # Every worker (and every restart) would otherwise re-encode the same
+        # ontology; cache it on disk keyed by model and ontology contents.
+        key = content_digest(json.dumps([self._embedder_id, ontology]).encode())
+        path = os.path.join(CACHE_DIR, f"ontology-{key}.npy")
         try:
-            if ext == "pdf":
-                text = pdf_extract_text(io.BytesIO(content))
-            elif ext == "docx":
-                doc = Document(io.BytesIO(content))
-                text = "\n".join([p.text for p in doc.paragraphs])
-            elif ext == "txt":
-                text = content.decode(errors='ignore')
-            else:
-                logger.warning(f"Unsupported file type: {ext}. Returning empty text.")
-        except Exception as e:
-            logger.error(f"Failed to parse file {filename}: {e}")
-        return self.parse_text(text)
+            # Memory-mapped: workers share the page cache instead of each holding a copy
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+
+        embeddings = self.embedder.encode(ontology, normalize_embeddings=True)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, embeddings)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache ontology embeddings at {path}: {e}")
+        return embeddings
+
+    def cached_extract(self, digest: str) -> Optional[ResumeExtract]:
+        extract = self.extract_cache.get(digest)
+        if extract is None:
+            data = self.extract_disk_cache.get((self._parser_id, digest))
+            if data is not None:
+                extract = ResumeExtract.model_construct(**data)
+                self.extract_cache.put(digest, extract)
+        return extract
+
+    def cache_extract(self, digest: str, extract: ResumeExtract) -> None:
+        self.extract_cache.put(digest, extract)
+        self.extract_disk_cache.set((self._parser_id, digest), extract.model_dump())
+
+    def parse_bytes(self, content: bytes, filename: str) -> ResumeExtract:
+        return self.parse_many([(content, filename)])[0]
+
+    def parse_many(self, items: List[Tuple[bytes, str]]) -> List[ResumeExtract]:
+        """Parse (content, filename) pairs, running NER and embedding over all uncached ones at once."""
+        keys = [content_digest(content) for content, _ in items]
+        extracts = [self.cached_extract(key) for key in keys]
+        misses = [i for i, extract in enumerate(extracts) if extract is None]
+        texts = [self.extract_text(*items[i]) for i in misses]
+        for i, extract in zip(misses, self.parse_batch(texts)):
+            self.cache_extract(keys[i], extract)
+            extracts[i] = extract
+        return extracts
+
+    def extract_text(self, content: bytes, filename: str) -> str:
+        return extract_text(content, filename)
 
     def parse_text(self, text: str) -> ResumeExtract:
-        sections = self._detect_sections(text)
+        return self.parse_batch([text])[0]
+
+    def parse_batch(self, texts: List[str]) -> List[ResumeExtract]:
+        # One walk over each resume's lines; the extractors below consume the per-section
+        # line lists directly instead of re-splitting the joined section text
+        all_section_lines = [self._detect_section_lines(text) for text in texts]
+        skill_groups = [self._skill_candidates_from_section(s.get("Technical Skills", [])) for s in all_section_lines]
+        cert_groups = [self._cert_candidates_from_section(s.get("Certifications", [])) for s in all_section_lines]
+
+        # Encode every candidate line of every resume in one call, then split
+        # the rows back per ontology and per resume.
+        flat_skills = [skill for group in skill_groups for skill in group]
+        flat_certs = [cert for group in cert_groups for cert in group]
+        flat_embeddings = self._encode(flat_skills + flat_certs)
+
+        skills = self._match_groups(skill_groups, flat_embeddings[:len(flat_skills)], self.skills_list, self._skills_lower, self.skill_embeddings, self._skill_token_index)
+        certifications = self._match_groups(cert_groups, flat_embeddings[len(flat_skills):], self.cert_list, self._certs_lower, self.cert_embeddings, self._cert_token_index)
 
+        names = self._extract_names(texts)
+
+        return [
+            self._build_extract(text, section_lines, names[i], skills[i], certifications[i])
+            for i, (text, section_lines) in enumerate(zip(texts, all_section_lines))
+        ]
+
+    def _build_extract(self, text: str, section_lines: dict, candidate_name: str, skills: List[str], certifications: List[str]) -> ResumeExtract:
         return ResumeExtract(
-            candidate_name=self._extract_name(text),
+            candidate_name=candidate_name,
             emails=self._extract_emails(text),
             phones=self._extract_phones(text),
-            skills=self._extract_skills_from_section(sections.get("Technical Skills", "")),
-            certifications=self._extract_certifications_from_section(sections.get("Certifications", "")),
-            education=self._extract_education_from_section(sections.get("Education", "")),
-            experience=self._extract_experience_from_section(sections.get("Work Experience", "")),
-            achievements=self._extract_semantic_section(sections.get("Achievements and Responsibilities", ""), ["award", "honor", "achievement", "winner", "place", "secured", "finalist"]),
-            projects=self._extract_semantic_section(sections.get("Projects", ""), ["project", "developed", "built", "designed", "implemented", "launched", "engineered"]),
-            publications=self._extract_semantic_section(sections.get("Publications", ""), ["publication", "paper", "journal", "conference"]),
-            languages=self._extract_semantic_section(sections.get("Languages", ""), ["language", "fluent", "proficient"]),
-            interests=self._extract_semantic_section(sections.get("Interests", ""), ["interest", "hobby", "extracurricular", "passion"]),
+            skills=skills,
+            certifications=certifications,
+            education=self._extract_education_from_section(section_lines.get("Education", [])),
+            experience=self._extract_experience_from_section(section_lines.get("Work Experience", [])),
+            achievements=self._extract_semantic_section(section_lines.get("Achievements and Responsibilities", []), ["award", "honor", "achievement", "winner", "place", "secured", "finalist"]),
+            projects=self._extract_semantic_section(section_lines.get("Projects", []), ["project", "developed", "built", "designed", "implemented", "launched", "engineered"]),
+            publications=self._extract_semantic_section(section_lines.get("Publications", []), ["publication", "paper", "journal", "conference"]),
+            languages=self._extract_semantic_section(section_lines.get("Languages", []), ["language", "fluent", "proficient"]),
+            interests=self._extract_semantic_section(section_lines.get("Interests", []), ["interest", "hobby", "extracurricular", "passion"]),
             raw_text=text,
-            sections=sections
+            sections={section: "\n".join(lines) for section, lines in section_lines.items()}
         )
 
     def _detect_sections(self, text: str) -> dict:
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        return {section: "\n".join(lines) for section, lines in self._detect_section_lines(text).items()}
+
+    def _detect_section_lines(self, text: str) -> dict:
+        """Section -> its stripped, non-empty lines."""
         sections = {}
         current_section = "Header"
         buffer = []
 
-        section_keywords = {
-            "Education": ["education"],
-            "Work Experience": ["work experience", "employment history", "professional experience"],
-            "Technical Skills": ["technical skills", "skills"],
-            "Projects": ["projects"],
-            "Achievements and Responsibilities": ["achievements and responsibilities", "achievements", "honors", "awards"],
-            "Certifications": ["certifications", "licenses"],
-            "Publications": ["publications"],
-            "Languages": ["languages"],
-            "Interests": ["interests", "hobbies"]
-        }
-
-        for line in lines:
-            is_heading = False
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
             normalized_line = line.lower().strip(':').strip()
-            
-            for sec, keywords in section_keywords.items():
-                if normalized_line in keywords:
-                    if buffer: # Save the previous section's content
-                        sections[current_section] = "\n".join(buffer)
-                    current_section = sec
-                    buffer = [] # Start a new buffer for the new section
-                    is_heading = True
-                    break
-            
-            if not is_heading:
+            sec = self._SECTION_BY_KEYWORD.get(normalized_line)
+            if sec is not None:
+                if buffer: # Save the previous section's content
+                    sections[current_section] = buffer
+                current_section = sec
+                buffer = [] # Start a new buffer for the new section
+            else:
                 buffer.append(line)
         
         if buffer: # Save the last section
-            sections[current_section] = "\n".join(buffer)
+            sections[current_section] = buffer
             
         return sections
 
 
-    def _extract_name(self, text: str) -> str:
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        if lines:
-            first_line = lines[0]
-            if '@' not in first_line and '·' not in first_line and len(first_line.split()) < 4:
-                return first_line
+    def _extract_names(self, texts: List[str]) -> List[str]:
+        all_lines = [[line.strip() for line in text.split('\n') if line.strip()] for text in texts]
+        names = []
+        for lines in all_lines:
+            first_line = lines[0] if lines else ""
+            if first_line and '@' not in first_line and '·' not in first_line and len(first_line.split()) < 4:
+                names.append(first_line)
+            else:
+                names.append(None)
 
-        doc = self.nlp(text)
-        for ent in doc.ents:
-            if ent.label_ == "PERSON":
-                # Filter out company names that SpaCy might mislabel
-                if " " in ent.text and len(ent.text.split()) < 4:
-                    return ent.text
-        
-        return "Unknown" if not lines else lines[0] # Final fallback
+        # NER only where the first-line heuristic failed, and only over the
+        # first few lines where the name actually lives.
+        pending = [i for i, name in enumerate(names) if name is None]
+        headers = ["\n".join(all_lines[i][:self._NAME_HEADER_LINES])[:self._NAME_HEADER_CHARS] for i in pending]
+        for i, doc in zip(pending, self.nlp.pipe(headers, batch_size=self.nlp_batch_size, n_process=self.nlp_n_process)):
+            # First multi-word PERSON; the word limit filters out company names SpaCy might mislabel
+            names[i] = next(
+                (ent.text for ent in doc.ents if ent.label_ == "PERSON" and " " in ent.text and len(ent.text.split()) < 4),
+                None
+            )
+            if names[i] is None:
+                names[i] = "Unknown" if not all_lines[i] else all_lines[i][0] # Final fallback
+
+        return names
 
     def _extract_emails(self, text: str) -> List[str]:
-        return sorted(list(set(re.findall(r"[\w\.\-]+@[\w\.\-]+", text))))
+        # First-seen order, deduplicated in one pass
+        return list(dict.fromkeys(_EMAIL_RE.findall(text)))
 
     def _extract_phones(self, text: str) -> List[str]:
-        return sorted(list(set(re.findall(r"(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}", text))))
+        return list(dict.fromkeys(_PHONE_RE.findall(text)))
 
-    def _extract_skills_from_section(self, section_text: str) -> List[str]:
-        if not section_text:
-            return []
-        
-        lines = section_text.split('\n')
+    def _skill_candidates_from_section(self, lines: List[str]) -> List[str]:
         potential_skills = []
         for line in lines:
             line_content = line.split(":", 1)[-1]
             potential_skills.extend(line_content.split(','))
             
-        cleaned_skills = [skill.strip() for skill in potential_skills if skill.strip()]
-        return self._semantic_match(cleaned_skills, self.skills_list, self.skill_embeddings)
+        return [skill.strip() for skill in potential_skills if skill.strip()]
 
-    def _extract_certifications_from_section(self, section_text: str) -> List[str]:
-        if not section_text:
-            return []
-        potential_certs = section_text.split('\n')
-        cleaned_certs = [cert.strip() for cert in potential_certs if cert.strip()]
-        return self._semantic_match(cleaned_certs, self.cert_list, self.cert_embeddings)
+    def _cert_candidates_from_section(self, lines: List[str]) -> List[str]:
+        return [cert.strip() for cert in lines if cert.strip()]
+
+    def _encode(self, sentences: List[str]) -> np.ndarray:
+        if not sentences:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        # Sort by length so each batch pads to similar sizes, then restore
+        # the caller's order.
+        order = np.argsort([len(s) for s in sentences], kind="stable")
+        sorted_embeddings = self.embedder.encode(
+            [sentences[i] for i in order],
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        embeddings = np.empty(sorted_embeddings.shape, dtype=np.float32)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+    def _best_matches(self, text_embeddings: np.ndarray, embeddings):
+        """Best ontology index and score for every row of text_embeddings."""
+        # Score one ontology block at a time with a running max, so large
+        # ontologies never materialize the full N x K score matrix.
+        n = len(text_embeddings)
+        best_idx = np.zeros(n, dtype=np.int64)
+        best_scores = np.full(n, -np.inf, dtype=np.float32)
+        rows = np.arange(n)
+
+        if self.ontology_precision == "int8":
+            text_codes, text_scales = quantize_int8(text_embeddings)
+            ontology_codes, ontology_scales = embeddings
+            size = len(ontology_codes)
+        else:
+            size = len(embeddings)
+
+        for start in range(0, size, self._ONTOLOGY_BLOCK):
+            end = start + self._ONTOLOGY_BLOCK
+            if self.ontology_precision == "int8":
+                block_scores = int8_dot(text_codes, text_scales, ontology_codes[start:end], ontology_scales[start:end])
+            else:
+                block_scores = np.dot(text_embeddings, embeddings[start:end].astype(np.float32, copy=False).T)
+            block_idx = block_scores.argmax(axis=1)
+            block_best = block_scores[rows, block_idx]
+            better = block_best > best_scores
+            best_idx[better] = block_idx[better] + start
+            best_scores[better] = block_best[better]
+
+        return best_idx, best_scores
 
-    def _semantic_match(self, text_list: List[str], ontology: List[str], embeddings: np.ndarray, threshold=0.6) -> List[str]:
+    def _build_token_index(self, ontology: List[str]) -> dict:
+        # Lowercased first word of each entry -> indices of entries starting with it
+        index = defaultdict(list)
+        for i, item in enumerate(ontology):
+            tokens = self._TOKEN_RE.findall(item.lower())
+            if tokens:
+                index[tokens[0]].append(i)
+        return dict(index)
+
+    def _take(self, embeddings, idx: np.ndarray):
+        if self.ontology_precision == "int8":
+            codes, scales = embeddings
+            return codes[idx], scales[idx]
+        return embeddings[idx]
+
+    def _prefiltered_best_matches(self, texts: List[str], text_embeddings: np.ndarray, embeddings, token_index: dict, threshold: float):
+        # First score only the ontology entries whose first word occurs in the
+        # text; sentences that clear the threshold there are done. The rest
+        # (e.g. "ML" vs "Machine Learning") fall back to the full ontology.
+        tokens = set(self._TOKEN_RE.findall(" ".join(texts).lower()))
+        candidate_idx = sorted({i for token in tokens for i in token_index.get(token, ())})
+
+        best_idx = np.zeros(len(texts), dtype=np.int64)
+        best_scores = np.full(len(texts), -np.inf, dtype=np.float32)
+        if candidate_idx:
+            candidates = np.asarray(candidate_idx)
+            sub_idx, best_scores = self._best_matches(text_embeddings, self._take(embeddings, candidates))
+            best_idx = candidates[sub_idx]
+
+        unmatched = np.flatnonzero(best_scores <= threshold)
+        if len(unmatched):
+            best_idx[unmatched], best_scores[unmatched] = self._best_matches(text_embeddings[unmatched], embeddings)
+        return best_idx, best_scores
+
+    def _match_groups(self, groups: List[List[str]], text_embeddings: np.ndarray, ontology: List[str], ontology_lower: List[str], embeddings, token_index: dict, threshold=0.6) -> List[List[str]]:
+        # Score all groups together; rows are laid out group after group.
+        texts = [text for group in groups for text in group]
+        best_idx, best_scores = self._prefiltered_best_matches(texts, text_embeddings, embeddings, token_index, threshold)
+        results = []
+        start = 0
+        for group in groups:
+            end = start + len(group)
+            results.append(self._semantic_match(group, ontology, ontology_lower, best_idx[start:end], best_scores[start:end], threshold))
+            start = end
+        return results
+
+    def _semantic_match(self, text_list: List[str], ontology: List[str], ontology_lower: List[str], best_idx: np.ndarray, best_scores: np.ndarray, threshold=0.6) -> List[str]:
         if not text_list:
             return []
-        text_embeddings = self.embedder.encode(text_list, normalize_embeddings=True)
         
-        cosine_scores = np.dot(text_embeddings, embeddings.T)
-        
-        found = set()
-        for i in range(len(text_list)):
-            best_match_idx = np.argmax(cosine_scores[i])
-            if cosine_scores[i][best_match_idx] > threshold:
-                found.add(ontology[best_match_idx])
-        for text in text_list:
-            for item in ontology:
-                if item.lower() in text.lower():
-                    found.add(item)
+        found = {ontology[i] for i in best_idx[best_scores > threshold]}
+        # Candidates are single lines, so one search per entry over the newline-joined
+        # lines finds exactly the entries contained in some line
+        joined = "\n".join(text_list).lower()
+        found.update(item for item, item_lower in zip(ontology, ontology_lower) if item_lower is not None and item_lower in joined)
                     
         return sorted(list(found))
 
-    def _extract_education_from_section(self, text: str) -> List[str]:
-        if not text:
-            return []
-        return [line.strip() for line in text.split('\n') if line.strip()]
+    def _extract_education_from_section(self, lines: List[str]) -> List[str]:
+        return [line.strip() for line in lines if line.strip()]
 
-    def _extract_experience_from_section(self, text: str) -> List[str]:
-        if not text:
-            return []
-        
-        lines = text.split('\n')
+    def _extract_experience_from_section(self, lines: List[str]) -> List[str]:
         experiences = []
-        current_job = ""
-        
+        # Lines of the current job, joined once at the job boundary
+        current_job = []
+
         for line in lines:
             if line.strip().startswith('•'):
-                current_job += "\n" + line
+                current_job.append(line)
             else:
-                if current_job:
-                    experiences.append(current_job.strip())
-                current_job = line
-        
-        if current_job:
-            experiences.append(current_job.strip())
-            
+                job = "\n".join(current_job)
+                if job:
+                    experiences.append(job.strip())
+                current_job = [line]
+
+        job = "\n".join(current_job)
+        if job:
+            experiences.append(job.strip())
+
         return experiences
 
-    def _extract_semantic_section(self, text: str, keywords: List[str]) -> List[str]:
-        if not text:
-            return []
-        return [s.strip() for s in text.split('\n') if s.strip()]
+    def _extract_semantic_section(self, lines: List[str], keywords: List[str]) -> List[str]:
+        return [s.strip() for s in lines if s.strip()]
 
     def _load_ontology(self, source: Optional[str], default_type: str) -> List[str]:
         default_skills = [
@@ -224,12 +537,21 @@ class ResumeParser:
             return default_skills if default_type == "skills" else default_certs
         try:
             if source.startswith("http"):
-                resp = requests.get(source)
-                resp.raise_for_status()
-                return json.loads(resp.text)
+                return download_ontology(source)
             else:
                 with open(source, "r") as f:
                     return json.load(f)
         except Exception as e:
             logger.warning(f"Failed to load {default_type} ontology from {source}: {e}")
-            return default_skills if default_type == "skills" else default_certs
\ No newline at end of file
+            return default_skills if default_type == "skills" else default_certs
+
+
+@lru_cache(maxsize=8)
+def get_parser(
+    skill_source: Optional[str] = None,
+    cert_source: Optional[str] = None,
+    nlp_model: str = "en_core_web_sm",
+    embedding_model: str = EMBEDDING_MODEL
+) -> ResumeParser:
+    """Shared parser per configuration, so spaCy, the embedder and the ontology are loaded once per process."""
+    return ResumeParser(skill_source, cert_source, nlp_model, embedding_model)
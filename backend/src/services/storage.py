@@ -1,9 +1,31 @@
 from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from pymongo.operations import SearchIndexModel
+from bson.binary import Binary, BinaryVectorDtype
 from bson.objectid import ObjectId
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import numpy as np
 from src.config import settings
 
+RESUME_VECTOR_INDEX = "resume_vec"
+# Listing queries never need the stored vector; raw_text is the bulk of every other document
+_NO_EMBEDDING = {"embedding": 0}
+_NO_RAW_TEXT = {"embedding": 0, "raw_text": 0}
+
+
+def pack_embedding(embedding: np.ndarray) -> Binary:
+    """Embedding as a BSON float32 vector, the binary form Atlas $vectorSearch indexes directly."""
+    return Binary.from_vector(np.asarray(embedding, dtype=np.float32).tolist(), BinaryVectorDtype.FLOAT32)
+
+
+def unpack_embedding(value) -> np.ndarray:
+    if isinstance(value, Binary) and value.subtype == 9:
+        return np.frombuffer(value, dtype=np.float32, offset=2)
+    # Older documents hold the raw float32 bytes
+    return np.frombuffer(value, dtype=np.float32)
+
+
 class MongoStorageAdapter:
     def __init__(self, db_url: str):
         try:
@@ -13,6 +35,7 @@ class MongoStorageAdapter:
 
             # Indexes for optimization
             self.db.resumes.create_index([("upload_date", DESCENDING)])
+            self.db.resumes.create_index([("content_hash", ASCENDING)])
             self.db.jobs.create_index([("created_at", DESCENDING)])
             print("Connected to MongoDB successfully!")
 
@@ -27,9 +50,21 @@ class MongoStorageAdapter:
         result = self.db.resumes.insert_one(resume_extract)
         return str(result.inserted_id)
 
-    def get_resume(self, resume_id: str) -> Optional[Dict[str, Any]]:
+    def save_resumes_bulk(self, resume_extracts: List[Dict[str, Any]]) -> List[str]:
+        """Insert many resumes in one round-trip; unordered so one bad document does not stop the rest."""
+        if not resume_extracts:
+            return []
+        now = datetime.utcnow()
+        for resume_extract in resume_extracts:
+            resume_extract["upload_date"] = resume_extract.get("upload_date", now)
+        result = self.db.resumes.insert_many(resume_extracts, ordered=False)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    def get_resume(self, resume_id: str, include_raw: bool = False) -> Optional[Dict[str, Any]]:
         try:
-            resume = self.db.resumes.find_one({"_id": ObjectId(resume_id)})
+            resume = self.db.resumes.find_one(
+                {"_id": ObjectId(resume_id)}, _NO_EMBEDDING if include_raw else _NO_RAW_TEXT
+            )
             if resume:
                 resume["_id"] = str(resume["_id"])
             return resume
@@ -37,8 +72,60 @@ class MongoStorageAdapter:
             print(f"Error retrieving resume {resume_id}: {e}")
             return None
 
-    def get_all_resumes(self, limit: int = 20) -> List[Dict[str, Any]]:
-        resumes = list(self.db.resumes.find().sort("upload_date", DESCENDING).limit(limit))
+    def get_resume_embeddings(self, content_hashes: List[str], embedding_model: str) -> Dict[str, np.ndarray]:
+        """Stored summary embeddings for the given upload hashes."""
+        docs = self.db.resumes.find(
+            {"content_hash": {"$in": content_hashes}, "embedding_model": embedding_model},
+            {"_id": 0, "content_hash": 1, "embedding": 1}
+        )
+        return {doc["content_hash"]: unpack_embedding(doc["embedding"]) for doc in docs}
+
+    def ensure_vector_index(self, dimensions: int) -> bool:
+        """Create the Atlas vector index over resume embeddings. Returns False where search indexes are unavailable."""
+        definition = {"fields": [
+            # Stored embeddings are unit length, so dot product ranks the same as cosine
+            {"type": "vector", "path": "embedding", "numDimensions": dimensions, "similarity": "dotProduct"},
+            {"type": "filter", "path": "embedding_model"}
+        ]}
+        try:
+            existing = next(iter(self.db.resumes.list_search_indexes(RESUME_VECTOR_INDEX)), None)
+            if existing is None:
+                self.db.resumes.create_search_index(SearchIndexModel(
+                    name=RESUME_VECTOR_INDEX, type="vectorSearch", definition=definition
+                ))
+            elif existing.get("latestDefinition") != definition:
+                # e.g. MATCH_EMBEDDING_PROVIDER switched between 384- and 768-dimension models
+                self.db.resumes.update_search_index(RESUME_VECTOR_INDEX, definition)
+            return True
+        except PyMongoError as e:
+            print(f"Vector search index unavailable, shortlists fall back to recency: {e}")
+            return False
+
+    def search_resumes_by_embedding(
+        self, query_embedding: np.ndarray, embedding_model: str, top_k: int = 10, num_candidates: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Nearest stored resumes to query_embedding via $vectorSearch, best first."""
+        resumes = list(self.db.resumes.aggregate([
+            {"$vectorSearch": {
+                "index": RESUME_VECTOR_INDEX,
+                "path": "embedding",
+                "queryVector": pack_embedding(query_embedding),
+                "filter": {"embedding_model": embedding_model},
+                "numCandidates": max(num_candidates, top_k),
+                "limit": top_k
+            }},
+            {"$addFields": {"score": {"$meta": "vectorSearchScore"}}},
+            {"$project": {"embedding": 0}}
+        ]))
+        for r in resumes:
+            r["_id"] = str(r["_id"])
+        return resumes
+
+    def get_all_resumes(self, limit: int = 20, include_raw: bool = False) -> List[Dict[str, Any]]:
+        resumes = list(
+            self.db.resumes.find({}, _NO_EMBEDDING if include_raw else _NO_RAW_TEXT)
+            .sort("upload_date", DESCENDING).limit(limit)
+        )
         for r in resumes:
             r["_id"] = str(r["_id"])
         return resumes
@@ -62,9 +149,14 @@ class MongoStorageAdapter:
 
     # Shortlist Methods
 
-    def get_shortlist(self, job_id: str, top_k: int = 10) -> List[Dict[str, Any]]:
+    def get_shortlist(
+        self, job_id: str, top_k: int = 10,
+        job_embedding: Optional[np.ndarray] = None, embedding_model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        if job_embedding is not None and embedding_model is not None:
+            return self.search_resumes_by_embedding(job_embedding, embedding_model, top_k)
         resumes = list(
-            self.db.resumes.find().sort("upload_date", DESCENDING).limit(top_k)
+            self.db.resumes.find({}, _NO_RAW_TEXT).sort("upload_date", DESCENDING).limit(top_k)
         )
         for r in resumes:
             r["_id"] = str(r["_id"])
@@ -67,6 +67,8 @@ export default function ResumeMatcherUI() {
       });
 
       formData.append('top_k', topK.toString());
+      // Resume texts are needed later for the PDF report
+      formData.append('include_raw', 'true');
 
       const response = await fetch('http://localhost:8000/api/v1/match-multiple', {
         method: 'POST',